@@ -0,0 +1,1118 @@
+#!/bin/python
+"""
+plot_csv - load, clean, transpose and plot csv files
+
+The plot_csv script is a thin command line wrapper around this module, the
+same steps can be run in-process:
+
+    import plot_csv
+    file = plot_csv.orient_csv_matrix(plot_csv.load_csv_matrix('run.csv'))
+    renderer = plot_csv.plot_to_png(file, 'run.png', plot_csv.PlotOptions())
+"""
+
+import numpy as np
+import csv
+import os
+import io
+import json
+import hashlib
+import tempfile
+import contextlib
+import math
+import warnings
+import argparse
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+color = ['b', 'g', 'r', 'y', 'm', 'c', 'k', 'w']
+
+cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME',
+    os.path.expanduser('~/.cache')), 'plot_csv')
+
+
+@dataclass
+class PlotOptions:
+    """what to plot and how, same meaning as the command line flags"""
+    main: int = 0
+    ignore: List[int] = field(default_factory=list)
+    plot: List[int] = field(default_factory=list)
+    x_label: str = 'ox'
+    y_label: str = 'oy'
+    title: str = 'Title'
+    width: int = 6
+    height: int = 6
+    density: Optional[str] = None
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(**{name: getattr(args, name) for name in cls.__dataclass_fields__})
+
+
+def read_csv_file(filename):
+    file = []
+    with open(filename,'r') as csvfile:
+        plots = csv.reader(csvfile, delimiter = ',')
+        for row in plots:
+            file.append(row)
+    return file
+
+def clean_csv_row(row, max_row_len):
+    for j,c in enumerate(row):
+        if c == '':
+            row[j] = 0
+        try:
+            # row[j] = round(float(c), 4)
+            row[j] = float(c)
+        except:
+            pass
+
+    if len(row) < max_row_len:
+        row.append(0)
+    return row
+
+def clean_csv_matrix(file):
+    max_row_len = len(file[0])
+    for r in file:
+        clean_csv_row(r, max_row_len)
+    return file
+
+def cache_entry(filename):
+    # entries are keyed by the real path, and the sidecar remembers which
+    # version of the file (inode, size, mtime) the binary matrix came from
+    path = os.path.realpath(filename)
+    st = os.stat(path)
+    base = os.path.join(cache_dir, hashlib.sha1(path.encode()).hexdigest())
+    identity = [path, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+    return base, identity
+
+def evict_cached_matrix(base):
+    for ext in ('.json', '.npy'):
+        try:
+            os.remove(base + ext)
+        except FileNotFoundError:
+            pass
+
+def prune_csv_cache():
+    # drop entries whose source file changed or disappeared
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        base = os.path.join(cache_dir, name[:-5])
+        try:
+            with open(base + '.json') as f:
+                identity = json.load(f)['identity']
+            if cache_entry(identity[0])[1] == identity:
+                continue
+        except (OSError, ValueError, KeyError):
+            pass
+        evict_cached_matrix(base)
+
+class ArrayRow:
+    """
+    one cleaned row kept as a float array, labels and empty cells (NaN in
+    the array) are overlaid on access; a slice that covers none of them is
+    a view of the array, anything else a list
+    """
+    __slots__ = ('values', 'overlay')
+
+    def __init__(self, values, overlay):
+        self.values = values
+        self.overlay = overlay
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            cells = range(*key.indices(len(self.values)))
+            if not any(j in cells for j in self.overlay):
+                return self.values[key]
+            return [self[j] for j in cells]
+        if key < 0:
+            key += len(self.values)
+        if key in self.overlay:
+            return self.overlay[key]
+        return float(self.values[key])
+
+    def __iter__(self):
+        row = self.values.tolist()
+        for j, c in self.overlay.items():
+            row[j] = c
+        return iter(row)
+
+class BlockMatrix(Sequence):
+    """
+    a header row over one 2d array of numbers (a file stored in columns),
+    rows are views of the block and transposing is a single copy
+    """
+    def __init__(self, header, block):
+        self.header = header
+        self.block = block
+
+    def __len__(self):
+        return len(self.block) + 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i == 0:
+            return self.header
+        if not 0 < i < len(self):
+            raise IndexError(i)
+        return ArrayRow(self.block[i - 1], {})
+
+    def transpose(self):
+        # zip() would stop at the shortest row as well
+        k = min(len(self.header), self.block.shape[1])
+        data = np.empty((k, len(self.block) + 1))
+        data[:, 0] = self.header.values[:k]
+        data[:, 1:] = self.block[:, :k].T
+        return [ArrayRow(data[j], {0: self.header.overlay[j]} if j in self.header.overlay else {})
+                for j in range(k)]
+
+def array_row(row):
+    """ArrayRow of a row cleaned by clean_csv_row"""
+    values = np.array([c if isinstance(c, float) else np.nan for c in row])
+    return ArrayRow(values, {j: c for j, c in enumerate(row) if not isinstance(c, float)})
+
+def parse_numeric_row(line):
+    """ArrayRow of a line of numbers with an optional label first, else None"""
+    fields = line.count(',') + 1
+    with warnings.catch_warnings():
+        # fromstring only warns when it stops at something that isn't a number
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(line, sep=',')
+            if len(values) == fields:
+                return ArrayRow(values, {})
+        except (ValueError, DeprecationWarning):
+            pass
+        label, _, rest = line.partition(',')
+        try:
+            values = np.fromstring(rest, sep=',')
+        except (ValueError, DeprecationWarning):
+            return None
+    if not rest or len(values) != fields - 1:
+        return None
+    try:
+        float(label)
+        return None
+    except ValueError:
+        pass
+    return ArrayRow(np.concatenate(([np.nan], values)), {0: label if label != '' else 0})
+
+def count_lines(f, start):
+    f.seek(start)
+    lines = 0
+    last = ''
+    for chunk in iter(lambda: f.read(1024 * 1024), ''):
+        lines += chunk.count('\n')
+        last = chunk[-1]
+    return lines + (last not in ('', '\n'))
+
+def read_numeric_csv(filename):
+    """
+    clean_csv_matrix(read_csv_file(filename)) without a float() per cell:
+    the rows after the header are parsed by numpy's loadtxt as one block,
+    or line by line when they start with labels; None when the file needs
+    the csv module (quotes, empty cells, ragged or blank rows)
+    """
+    with open(filename) as f:
+        line = f.readline().rstrip('\n')
+        if not line or '"' in line:
+            return None
+        header = parse_numeric_row(line)
+        if header is None:
+            fields = line.split(',')
+            header = array_row(clean_csv_row(fields, len(fields)))
+
+        start = f.tell()
+        with warnings.catch_warnings():
+            # an empty body only warns
+            warnings.simplefilter('error')
+            try:
+                block = np.loadtxt(f, delimiter=',', dtype=float, comments=None,
+                        quotechar=None, ndmin=2)
+            except (ValueError, UserWarning):
+                block = None
+        # loadtxt skips blank lines, the csv module doesn't
+        if (block is not None and block.shape[1] == len(header)
+                and len(block) == count_lines(f, start)):
+            return BlockMatrix(header, block)
+
+        f.seek(start)
+        rows = [header]
+        for line in f:
+            row = parse_numeric_row(line.rstrip('\n'))
+            if row is None or len(row) < len(header):
+                return None
+            rows.append(row)
+        return rows
+
+def load_cached_matrix(filename):
+    """clean matrix from the cache or None, rows are views of the mapped .npy"""
+    base, identity = cache_entry(filename)
+    try:
+        with open(base + '.json') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if sidecar.get('identity') != identity:
+        evict_cached_matrix(base)
+        return None
+    try:
+        data = np.load(base + '.npy', mmap_mode='r')
+    except (OSError, ValueError):
+        evict_cached_matrix(base)
+        return None
+
+    overlays = {}
+    for i, j in sidecar['zeros']:
+        overlays.setdefault(i, {})[j] = 0
+    for i, j, label in sidecar['labels']:
+        overlays.setdefault(i, {})[j] = label
+    lengths = sidecar['lengths']
+    # a file stored in columns: numbers only, in rows of one length, after the header
+    if len(lengths) > 1 and len(set(lengths[1:])) == 1 and list(overlays) in ([], [0]):
+        return BlockMatrix(ArrayRow(data[0, :lengths[0]], overlays.get(0, {})),
+                data[1:, :lengths[1]])
+    return [ArrayRow(data[i, :n], overlays.get(i, {})) for i, n in enumerate(lengths)]
+
+def save_cached_matrix(filename, file):
+    """store a cleaned matrix as .npy (NaN padded) plus a label sidecar"""
+    if not file:
+        return
+    base, identity = cache_entry(filename)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if isinstance(file, BlockMatrix):
+        rows = [file.header]
+        lengths = [len(file.header)] + [file.block.shape[1]] * len(file.block)
+    else:
+        rows = file
+        lengths = [len(r) for r in file]
+    data = np.full((len(file), max(lengths)), np.nan)
+    if isinstance(file, BlockMatrix):
+        data[1:, :file.block.shape[1]] = file.block
+    zeros = []
+    labels = []
+    for i, r in enumerate(rows):
+        if isinstance(r, ArrayRow):
+            data[i, :len(r)] = r.values
+            cells = r.overlay.items()
+        else:
+            cells = enumerate(r)
+        for j, c in cells:
+            if isinstance(c, float):
+                data[i, j] = c
+            elif c == 0:
+                zeros.append([i, j])
+            else:
+                labels.append([i, j, c])
+
+    # the sidecar is written last, an entry without it is never read
+    with open(base + '.npy.tmp', 'wb') as f:
+        np.save(f, data)
+    os.replace(base + '.npy.tmp', base + '.npy')
+    with open(base + '.json.tmp', 'w') as f:
+        # dumps() uses the C encoder, dump() streams in pure python
+        f.write(json.dumps({'identity': identity, 'lengths': lengths,
+            'zeros': zeros, 'labels': labels}))
+    os.replace(base + '.json.tmp', base + '.json')
+
+def load_csv_matrix(filename, cache=True):
+    """read and clean a csv file, through the parse cache unless cache=False"""
+    if cache:
+        file = load_cached_matrix(filename)
+        if file is not None:
+            return file
+    file = read_numeric_csv(filename)
+    if file is None:
+        file = clean_csv_matrix(read_csv_file(filename))
+    if cache:
+        save_cached_matrix(filename, file)
+    return file
+
+def transpose_csv_matrix(file):
+    if isinstance(file, BlockMatrix):
+        return file.transpose()
+    zipped_rows = zip(*file)
+    return [list(row) for row in zipped_rows]
+
+def csv_fragment(row):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()[:-2]
+
+def merge_spill_files(spills, out, rows):
+    """glue row n of every spill file side by side into row n of out"""
+    with contextlib.ExitStack() as stack:
+        readers = [csv.reader(stack.enter_context(open(spill, newline='')))
+                for spill in spills]
+        for _ in range(rows):
+            out.write(','.join(csv_fragment(next(r)) for r in readers))
+            out.write('\r\n')
+
+def stream_transpose_csv(filename, out_filename, budget_mb=256, max_open=64):
+    """
+    same result as clean + transpose (twice for column stored files) but
+    only a block of rows is kept in memory, blocks are spilled column-major
+    to temporary files and then merged side by side
+    """
+    budget = budget_mb * 1024 * 1024
+
+    with open(filename, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        first = next(reader, None)
+        if first is None:
+            open(out_filename, 'w').close()
+            return 0
+        max_row_len = len(first)
+        clean_csv_row(first, max_row_len)
+
+        # rows that don't end in a number are stored in columns, plotting
+        # transposes them once, so --transpose gives back the rows as they are
+        try:
+            float(first[len(first)-1])
+            column_major = False
+        except:
+            column_major = True
+
+        if column_major:
+            min_len = len(first)
+            for row in reader:
+                min_len = min(min_len, len(row) + (len(row) < max_row_len))
+            csvfile.seek(0)
+            with open(out_filename, 'w') as out:
+                writer = csv.writer(out)
+                for row in csv.reader(csvfile):
+                    writer.writerow(clean_csv_row(row, max_row_len)[:min_len])
+            return 0
+
+        with tempfile.TemporaryDirectory(
+                dir=os.path.dirname(out_filename) or '.') as spill_dir:
+            spills = []
+            block = [first]
+            size = 56 * len(first)
+
+            def spill():
+                path = os.path.join(spill_dir, f"{len(spills)}.csv")
+                with open(path, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    for j in range(min(len(r) for r in block)):
+                        writer.writerow([r[j] for r in block])
+                spills.append(path)
+
+            min_len = len(first)
+            for row in reader:
+                # a parsed cell costs roughly its text plus a float object
+                size += sum(len(c) for c in row) + 56 * len(row)
+                clean_csv_row(row, max_row_len)
+                min_len = min(min_len, len(row))
+                block.append(row)
+                if size >= budget:
+                    spill()
+                    block = []
+                    size = 0
+            if block:
+                spill()
+
+            # zip() stops at the shortest row, so only min_len rows are merged
+            while len(spills) > max_open:
+                merged = []
+                for k in range(0, len(spills), max_open):
+                    path = os.path.join(spill_dir, f"m{len(merged)}_{len(spills)}.csv")
+                    with open(path, 'w', newline='') as out:
+                        merge_spill_files(spills[k:k+max_open], out, min_len)
+                    for used in spills[k:k+max_open]:
+                        os.remove(used)
+                    merged.append(path)
+                spills = merged
+
+            with open(out_filename, 'w', newline='') as out:
+                merge_spill_files(spills, out, min_len)
+            return len(spills)
+
+def orient_csv_matrix(file, debug=False):
+    """series are stored in rows, transpose files that keep them in columns"""
+    if debug:
+        print_csv_matrix(file)
+
+    try:
+        float(file[0][len(file[0])-1])
+    except:
+        file = transpose_csv_matrix(file)
+        if debug:
+            print("Transposed csv file")
+            print_csv_matrix(file)
+    return file
+
+class WatchedCsv:
+    """
+    parsed content of a csv that keeps growing, update() only parses the
+    bytes appended since the last call, a file stored in columns is kept
+    transposed so new rows just extend every series
+    """
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.inode = None
+        self.offset = 0
+        self.rows = []
+        self.columns = None
+
+    def update(self):
+        """read new complete lines, True when something changed"""
+        st = os.stat(self.path)
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            # replaced or truncated, start over
+            self.reset()
+            self.inode = st.st_ino
+        if st.st_size == self.offset:
+            return False
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return False
+
+        # parse before moving on, a bad byte must not drop the rows around it
+        new_rows = list(csv.reader(io.StringIO(data[:end].decode(errors='replace'))))
+        self.offset += end
+        if not self.rows:
+            self.max_row_len = len(new_rows[0])
+        for row in new_rows:
+            self.add_row(clean_csv_row(row, self.max_row_len))
+        return True
+
+    def add_row(self, row):
+        if self.columns is None:
+            self.rows.append(row)
+            if len(self.rows) > 1:
+                return
+            try:
+                float(row[len(row)-1])
+                return
+            except:
+                self.columns = [[c] for c in row]
+            return
+
+        # zip() keeps only as many columns as the shortest row
+        del self.columns[len(row):]
+        for column, c in zip(self.columns, row):
+            column.append(c)
+
+    def matrix(self):
+        return self.columns if self.columns is not None else self.rows
+
+def watch_csv_dir(args, fileNames):
+    """plot every file, then re-plot the ones that change in input_dir"""
+    from inotify_watch import Inotify, IN_CLOSE_WRITE, IN_MODIFY, IN_MOVED_TO
+
+    opts = PlotOptions.from_args(args)
+    renderer = None
+    watched = {}
+
+    def replot(filename):
+        if filename not in watched:
+            watched[filename] = WatchedCsv(args.input_dir + "/" + filename)
+        nonlocal renderer
+        try:
+            if not watched[filename].update():
+                return
+            file = watched[filename].matrix()
+            if not file or len(file[0]) < 2:
+                return
+            renderer = plot_to_png(file,
+                    f"{args.output_dir}/{filename[0:len(filename)-4]}.png", opts, renderer)
+        except FileNotFoundError:
+            del watched[filename]
+            return
+        except (OSError, ValueError, TypeError, IndexError) as e:
+            # a bad line (non-numeric, not utf-8) must not stop the watcher,
+            # the file is plotted again once it was fixed or replaced; the
+            # figure may hold half-set data, start the next plot on a new one
+            print(filename, "FAILED to plot:", e)
+            renderer = None
+            return
+        print(filename, "SUCCESSFULLY plotted to",
+                f"{args.output_dir}/{filename}.png")
+
+    with Inotify() as inotify:
+        inotify.add_watch(args.input_dir, IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO)
+        for filename in fileNames:
+            replot(filename)
+        print("Watching", args.input_dir, "for changes")
+
+        while True:
+            events = inotify.read_burst(args.debounce, max(5 * args.debounce, 2))
+            for filename in sorted({name for _, name, _ in events}):
+                if '.csv' in filename and '#' not in filename:
+                    replot(filename)
+
+def print_csv_matrix(matrix):
+    for r in matrix:
+        print(*r)
+
+def numeric(values):
+    """True when every value converts to float, text makes matplotlib use categories"""
+    try:
+        np.asarray(values, dtype=float)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+class FigureRenderer:
+    """
+    one figure for every file of a run, only the line data is swapped,
+    matplotlib is imported here so --transpose never loads it
+    """
+    def __init__(self, width, height, interactive=False):
+        if interactive:
+            import matplotlib.pyplot as plt
+            self.figure = plt.figure(figsize=(width, height))
+        else:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.figure = Figure(figsize=(width, height), dpi=100)
+            FigureCanvasAgg(self.figure)
+        self.new_axes()
+
+    def new_axes(self):
+        """fresh axes, drops the lines, image and unit converters of the old one"""
+        self.figure.clear()
+        self.ax = self.figure.add_subplot()
+
+        # OX, OY axes
+        self.ax.axhline(0, color='#696969')
+        self.ax.axvline(0, color='#696969')
+        self.ax.grid()
+        self.lines = []
+        self.image = None
+        self.categorical = False
+
+    def render(self, x, yn, labels, x_label, y_label, title):
+        # set_data() doesn't set up unit converters like plot() does, text
+        # values get their own axes so categories never leak to the next file
+        categorical = not numeric(x) or not all(numeric(y) for y in yn)
+        if categorical or self.categorical:
+            self.new_axes()
+            self.categorical = categorical
+        if categorical:
+            self.ax.xaxis.update_units(x)
+            for y in yn:
+                self.ax.yaxis.update_units(y)
+
+        while len(self.lines) < len(yn):
+            line, = self.ax.plot([], [], color=color[len(self.lines) % len(color)],
+                    linestyle='solid', marker='o')
+            self.lines.append(line)
+
+        for i, line in enumerate(self.lines):
+            if i < len(yn):
+                # ragged rows are plotted up to the shorter of x and y
+                n = min(len(x), len(yn[i]))
+                line.set_data(x[:n], yn[i][:n])
+                line.set_label(labels[i])
+            else:
+                line.set_data([], [])
+            line.set_visible(i < len(yn))
+
+        if self.image is not None:
+            self.image.set_visible(False)
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        self.ax.set_xlabel(x_label)
+        self.ax.set_ylabel(y_label)
+        self.ax.set_title(title)
+        self.ax.legend(handles=self.lines[:len(yn)])
+
+    def pixel_shape(self):
+        """(rows, columns) of screen pixels covered by the axes"""
+        box = self.ax.get_window_extent()
+        return max(int(box.height), 1), max(int(box.width), 1)
+
+    def render_density(self, grid, extent, x_label, y_label, title):
+        for line in self.lines:
+            line.set_visible(False)
+        if self.ax.get_legend():
+            self.ax.get_legend().remove()
+
+        # log scale so sparse pixels stay visible next to dense ones
+        shown = np.ma.masked_equal(np.log1p(grid), 0)
+        if self.image is None:
+            self.image = self.ax.imshow(shown, extent=extent, origin='lower',
+                    aspect='auto', interpolation='nearest', cmap='viridis')
+        else:
+            self.image.set_data(shown)
+            self.image.set_extent(extent)
+            self.image.autoscale()
+            self.image.set_visible(True)
+        self.ax.set_xlim(extent[0], extent[1])
+        self.ax.set_ylim(extent[2], extent[3])
+        self.ax.set_xlabel(x_label)
+        self.ax.set_ylabel(y_label)
+        self.ax.set_title(title)
+
+    def render_aggregate(self, xs, mean, low, high, band, percentiles,
+            label, x_label, y_label, title):
+        """mean line over a min/max envelope and a percentile band"""
+        for line in self.lines:
+            line.set_visible(False)
+        if self.image is not None:
+            self.image.set_visible(False)
+
+        envelope = self.ax.fill_between(xs, low, high, color=color[0],
+                alpha=0.15, linewidth=0, label='min/max')
+        shaded = self.ax.fill_between(xs, band[0], band[1], color=color[0],
+                alpha=0.3, linewidth=0,
+                label=f"p{percentiles[0]:g}-p{percentiles[1]:g}")
+        line, = self.ax.plot(xs, mean, color=color[0], linestyle='solid',
+                label=f"{label} mean")
+
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        self.ax.set_xlabel(x_label)
+        self.ax.set_ylabel(y_label)
+        self.ax.set_title(title)
+        self.ax.legend(handles=[line, shaded, envelope])
+
+    def save(self, filename):
+        self.figure.savefig(filename, dpi=100)
+
+    def show(self):
+        import matplotlib.pyplot as plt
+        plt.show()
+        plt.close(self.figure)
+
+def density_grid(x, yn, shape, how='count'):
+    """
+    bin every (x, y) point into a shape sized pixel grid, count is the number
+    of points per pixel, mean and max combine the per series counts
+    """
+    rows, cols = shape
+    x = np.asarray(x, dtype=float)
+    yn = [np.asarray(y, dtype=float) for y in yn]
+
+    # --plot/--ignore may leave no series (or no x), the grid is then empty
+    x0, x1 = (np.nanmin(x), np.nanmax(x)) if len(x) else (0.0, 0.0)
+    ys = [y for y in yn if len(y)]
+    y0 = min(np.nanmin(y) for y in ys) if ys else 0.0
+    y1 = max(np.nanmax(y) for y in ys) if ys else 0.0
+    if x1 == x0:
+        x0, x1 = x0 - 0.5, x1 + 0.5
+    if y1 == y0:
+        y0, y1 = y0 - 0.5, y1 + 0.5
+
+    ix = np.clip(((x - x0) / (x1 - x0) * cols).astype(np.intp), 0, cols - 1)
+    total = np.zeros(rows * cols)
+    hits = np.zeros(rows * cols)
+    for y in yn:
+        n = min(len(x), len(y))
+        ok = ~(np.isnan(x[:n]) | np.isnan(y[:n]))
+        iy = np.clip(((y[:n][ok] - y0) / (y1 - y0) * rows).astype(np.intp), 0, rows - 1)
+        counts = np.bincount(iy * cols + ix[:n][ok], minlength=rows * cols)
+        if how == 'max':
+            np.maximum(total, counts, out=total)
+        else:
+            total += counts
+        hits += counts > 0
+
+    if how == 'mean':
+        total = np.divide(total, hits, out=np.zeros_like(total), where=hits > 0)
+    return total.reshape(rows, cols), (x0, x1, y0, y1)
+
+def select_series(file, opts):
+    """x values, y series and their labels picked by --main/--ignore/--plot"""
+    x = file[opts.main][1:len(file[opts.main])]
+    l_y = []
+    yn = []
+    for i, line in enumerate(file):
+        if i != opts.main and i not in opts.ignore:
+            if opts.plot == [] or i in opts.plot:
+                if -1 in opts.ignore and i == len(file) - 1:
+                    break
+                l_y.append(file[i][0])
+                #yn are all lines tha will be ploted on oy
+                yn.append(file[i][1:len(file[i])])
+    return x, yn, l_y
+
+def render_series(x, yn, labels, opts, renderer=None, x_label=None):
+    """draw the series as lines (or a density raster), returns the renderer"""
+    if renderer is None:
+        renderer = FigureRenderer(opts.width, opts.height)
+    if x_label is None:
+        x_label = opts.x_label
+    if opts.density:
+        grid, extent = density_grid(x, yn, renderer.pixel_shape(), opts.density)
+        renderer.render_density(grid, extent, x_label, opts.y_label, opts.title)
+    else:
+        renderer.render(x, yn, labels, x_label, opts.y_label, opts.title)
+    return renderer
+
+def render_matrix(file, opts, renderer=None):
+    x, yn, l_y = select_series(file, opts)
+    x_label = file[0][0] if opts.x_label == 'ox' else opts.x_label
+    return render_series(x, yn, l_y, opts, renderer, x_label)
+
+def plot_to_png(file, out_filename, opts, renderer=None):
+    """render a cleaned matrix to a png, pass the renderer back in to reuse it"""
+    renderer = render_matrix(file, opts, renderer)
+    renderer.save(out_filename)
+    return renderer
+
+
+class RunningStats:
+    """count, mean, variance (Welford) and min/max, merged with Chan's formula"""
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+class QuantileSketch:
+    """
+    mergeable quantile sketch, exact up to k values, past that every level
+    keeps at most k items and promotes every other one (KLL style) so an
+    item on level h stands for 2**h values
+    """
+    def __init__(self, k=128):
+        self.k = k
+        self.levels = [[]]
+        self.flip = 0
+
+    def add(self, value):
+        self.levels[0].append(value)
+        if len(self.levels[0]) >= self.k:
+            self.compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in zip(self.levels, other.levels):
+            level.extend(items)
+        self.compress()
+
+    def compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) >= self.k:
+                items.sort()
+                keep = [items.pop()] if len(items) % 2 else []
+                # alternate the kept half so the error doesn't drift one way
+                self.flip ^= 1
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                self.levels[h + 1].extend(items[self.flip::2])
+                self.levels[h] = keep
+            h += 1
+
+    def quantile(self, q):
+        weighted = sorted((v, 1 << h) for h, items in enumerate(self.levels)
+                for v in items)
+        total = sum(w for _, w in weighted)
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= q * total:
+                return value
+        return weighted[-1][0]
+
+class SeriesAggregate:
+    """streaming statistics of one series across many files, per x value"""
+    def __init__(self):
+        self.label = None
+        self.x_label = None
+        self.files = 0
+        self.stats = {}
+        self.sketches = {}
+
+    def add(self, x, y, label=None, x_label=None):
+        self.files += 1
+        if self.label is None:
+            self.label = label
+            self.x_label = x_label
+        for xv, yv in zip(x, y):
+            if not isinstance(xv, float) or not isinstance(yv, float):
+                continue
+            if xv not in self.stats:
+                self.stats[xv] = RunningStats()
+                self.sketches[xv] = QuantileSketch()
+            self.stats[xv].add(yv)
+            self.sketches[xv].add(yv)
+
+    def merge(self, other):
+        self.files += other.files
+        if self.label is None:
+            self.label = other.label
+            self.x_label = other.x_label
+        for xv, stats in other.stats.items():
+            if xv in self.stats:
+                self.stats[xv].merge(stats)
+                self.sketches[xv].merge(other.sketches[xv])
+            else:
+                self.stats[xv] = stats
+                self.sketches[xv] = other.sketches[xv]
+
+    def summary(self, percentiles=(25, 75)):
+        """x, mean, min, max and one list per percentile, sorted by x"""
+        xs = sorted(self.stats)
+        return (xs,
+                [self.stats[x].mean for x in xs],
+                [self.stats[x].min for x in xs],
+                [self.stats[x].max for x in xs],
+                [[self.sketches[x].quantile(p / 100) for x in xs] for p in percentiles])
+
+def aggregate_chunk(paths, series, main=0, cache=True):
+    """fold the chosen series of every file into one SeriesAggregate"""
+    aggregate = SeriesAggregate()
+    for path in paths:
+        file = orient_csv_matrix(load_csv_matrix(path, cache))
+        if series >= len(file):
+            print(path, "has no series", series)
+            continue
+        aggregate.add(file[main][1:], file[series][1:], file[series][0], file[main][0])
+    return aggregate
+
+def aggregate_files(paths, series, main=0, cache=True, jobs=None):
+    """
+    aggregate one series over many files, worker processes each parse a
+    chunk of the files and only their merged statistics come back
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 2:
+        return aggregate_chunk(paths, series, main, cache)
+
+    size = max(1, len(paths) // (jobs * 4))
+    aggregate = SeriesAggregate()
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(aggregate_chunk, paths[k:k+size], series, main, cache)
+                for k in range(0, len(paths), size)]
+        for future in as_completed(futures):
+            aggregate.merge(future.result())
+    return aggregate
+
+def plot_aggregate_png(aggregate, out_filename, opts, percentiles=(25, 75),
+        renderer=None):
+    if renderer is None:
+        renderer = FigureRenderer(opts.width, opts.height)
+    xs, mean, low, high, band = aggregate.summary(percentiles)
+    x_label = aggregate.x_label if opts.x_label == 'ox' else opts.x_label
+    renderer.render_aggregate(xs, mean, low, high, band, percentiles,
+            aggregate.label, x_label, opts.y_label, opts.title)
+    renderer.save(out_filename)
+    return renderer
+
+def plotting_stuff(args):
+    if args.filename:
+        fileNames = [args.filename]
+        args.output_dir = '.' if args.output_dir == 'png' else args.output_dir
+        args.input_dir = './'
+    else:
+        fileNames = os.listdir(args.input_dir)
+        fileNames = [file for file in fileNames if '.csv' in file and '#' not in file]
+
+    if args.output_dir != '.':
+        args.output_dir = args.input_dir + '_t' if args.transpose else args.output_dir
+        if not args.verbose:
+            try:
+                os.mkdir(args.output_dir)
+            except:
+                pass
+
+    if args.watch:
+        try:
+            watch_csv_dir(args, fileNames)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.cache:
+        prune_csv_cache()
+
+    if args.aggregate is not None:
+        paths = [os.path.join(args.input_dir, filename) for filename in sorted(fileNames)]
+        aggregate = aggregate_files(paths, args.aggregate, args.main, args.cache, args.jobs)
+        if not aggregate.stats:
+            print("Nothing to aggregate")
+            return
+        out_filename = f"{args.output_dir}/aggregate_{args.aggregate}.png"
+        plot_aggregate_png(aggregate, out_filename, PlotOptions.from_args(args),
+                args.percentiles)
+        print(aggregate.files, "files SUCCESSFULLY aggregated to", out_filename)
+        return
+
+    opts = PlotOptions.from_args(args)
+    renderer = None
+
+    for filename in fileNames:
+        if args.filename:
+            path = args.input_dir + filename
+        else:
+            path = args.input_dir + "/" + filename
+
+        if args.transpose:
+            blocks = stream_transpose_csv(path,
+                    args.output_dir + '/' + filename[0:len(filename)-4] + '_T.csv',
+                    args.memory_budget)
+            if args.debug:
+                print("Transposed in", blocks, "blocks")
+            print(filename, "SUCCESSFULLY transposed")
+            continue
+
+        print(filename, "was loaded")
+        file = load_csv_matrix(path, args.cache)
+        oriented = orient_csv_matrix(file, args.debug)
+        if oriented is not file:
+            print("File had to be transposed")
+        file = oriented
+
+        if args.filename:
+           filename = os.path.basename(args.filename)
+           args.filename = filename
+        if args.verbose:
+            # a shown window can't be reused once it is closed
+            render_matrix(file, opts,
+                    FigureRenderer(args.width, args.height, interactive=True)).show()
+            continue
+        renderer = plot_to_png(file,
+                f"{args.output_dir}/{filename[0:len(filename)-4]}.png", opts, renderer)
+        print(filename, "SUCCESSFULLY plotted to",
+                f"{args.output_dir}/{filename}.png")
+
+
+### for terminal arguments
+parser = argparse.ArgumentParser(description="""
+        Program to plot csv files - made by Catalin
+        first row will be used for the OX axis
+        and the following rows will be used for the OY axis
+        Is important for information to be stored in rows!!!
+        Use -t to transpose the file
+        To be noted first column will be used as labels
+        """)
+
+parser.add_argument('-v', action='store_true',
+        help='verbose', dest='verbose')
+
+parser.add_argument('-d', action='store_true',
+        help='debug; output csv file content if something went wrong', dest='debug')
+
+parser.add_argument('--transpose', action='store_true',
+        help="""transpose csv file, wont plot anything will create a new 
+        folder with transposed csv content""", dest='transpose')
+
+parser.add_argument('--watch', action='store_true', dest='watch',
+        help="""keep running and re-plot csv files in the input directory as
+        they change, rows appended to a file are parsed incrementally""")
+
+parser.add_argument('--debounce', type=float, default=0.5, metavar='SEC',
+        help="""with --watch wait for writes to pause this long before
+        re-plotting, default 0.5""")
+
+parser.add_argument('--memory-budget', type=int, default=256,
+        dest='memory_budget', metavar='MB',
+        help="""memory used for --transpose, bigger files are transposed in
+        blocks through temporary files, default 256""")
+
+parser.add_argument('--no-cache', action='store_false', dest='cache',
+        help="""don't use the parsed csv cache in ~/.cache/plot_csv, the
+        cache is refreshed whenever a csv file changes""")
+
+parser.add_argument('-f', help='plot only one file',
+        dest='filename', default=None)
+
+parser.add_argument("-i", dest="input_dir", default='csv',
+        help="input directory, default ./csv", metavar="DIR")
+
+parser.add_argument("-o", dest="output_dir", default='png',
+        help="output directory, default ./png", metavar="DIR")
+
+parser.add_argument("-x", dest="x_label", default='ox',
+        help="x label", metavar="'str'")
+
+parser.add_argument("-y", dest="y_label", default='oy',
+        help="y label", metavar="'str'")
+
+parser.add_argument("-t", dest="title", default='Title',
+        help="title", metavar="'str'")
+
+parser.add_argument("--main", type=int, default=0,
+        help="""select which of the rows or columns should be used as x axis, 0
+        will be the first index""")
+
+parser.add_argument("--ignore", type=int, nargs="+", default=[],
+        help="""select which of the rows or columns shouldn't be used, 0
+        will be the first index, -1 will ignore the last element""")
+
+parser.add_argument("--plot", dest="plot", nargs="+", type=int, default=[],
+        help="""choose what columns or rows to use for plotting y axis, 0
+        will be the first index""")
+
+parser.add_argument("--density", choices=['count', 'mean', 'max'],
+        default=None, help="""draw a raster of points per pixel instead of
+        lines, for series with millions of points, count adds up all series,
+        mean and max combine the counts of each series""")
+
+parser.add_argument("--aggregate", type=int, default=None, metavar='N',
+        help="""overlay series N (same index as --plot) of every file in one
+        figure as mean, min/max envelope and a percentile band""")
+
+parser.add_argument("--percentiles", type=float, nargs=2, default=[25, 75],
+        metavar=('LOW', 'HIGH'), help="""band drawn by --aggregate, default
+        25 75""")
+
+parser.add_argument("-j", "--jobs", type=int, default=None, dest='jobs',
+        help="""worker processes parsing files for --aggregate, default one
+        per cpu""")
+
+parser.add_argument("--height", type=int, default=6, dest='height',
+        help="""for aspect ratio default 6""")
+
+parser.add_argument("--width", type=int, default=6, dest='width',
+        help="""for aspect ratio default 6""")
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.watch and (args.filename or args.transpose or args.verbose):
+        parser.error("--watch works on an input directory and can't be used with -f, -v or --transpose")
+    if args.debug:
+        print("args:", args)
+    plotting_stuff(args)
+
+if __name__ == "__main__":
+    main()
+
@@ -10,7 +10,11 @@ import tempfile
 import shutil
 import subprocess
 import time
+import hmac
+import socket
+import secrets
 import threading
+from collections import OrderedDict
 from pathlib import Path
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
@@ -137,7 +141,135 @@ class ClipboardManager:
         """Get fresh clipboard content (not squashed)"""
         return self.get_clipboard_content()
 
+class PreviewServer:
+    """Serve the first lines of prompt files to fzf's preview over a local socket"""
+
+    def __init__(self, lines: int = 20, capacity: int = 512, radius: int = 25):
+        self.lines = lines
+        self.capacity = capacity
+        self.radius = radius
+        self.files: List[str] = []
+        self.allowed = set()
+        # path -> (mtime_ns, head), least recently shown first
+        self.heads: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.cursor = threading.Condition()
+        self.target: Optional[int] = None
+        # the port is open to every local user, requests must carry this;
+        # it reaches the preview through fzf's environment, not its arguments
+        self.token = secrets.token_hex(16)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+        threading.Thread(target=self._warm_loop, daemon=True).start()
+
+    def set_files(self, files: List[Path]):
+        """Files fzf is about to list, in the same order; warms the top of the list"""
+        with self.cursor:
+            self.files = [str(f) for f in files]
+            self.allowed = set(self.files)
+            self.target = 0
+            self.cursor.notify()
+
+    def preview_command(self) -> str:
+        """bash-only preview: talk to the server with /dev/tcp, no extra process"""
+        return (f"exec 3<>/dev/tcp/127.0.0.1/{self.port} && "
+                "printf '%s\\t%s\\t%s\\n' \"$PROMPT_PREVIEW_TOKEN\" {n} {2} >&3 && "
+                "while IFS= read -r line <&3 || [ -n \"$line\" ]; do printf '%s\\n' \"$line\"; done")
+
+    def head(self, path: str) -> str:
+        """First lines of path, from the cache while its mtime is unchanged"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return ""
+        with self.lock:
+            cached = self.heads.get(path)
+            if cached and cached[0] == mtime:
+                self.heads.move_to_end(path)
+                return cached[1]
+
+        try:
+            with open(path, errors="replace") as f:
+                # bounded read, a huge one-line file must not be loaded whole
+                text = "\n".join(f.read(64 * 1024).splitlines()[:self.lines]) + "\n"
+        except OSError:
+            return ""
+        with self.lock:
+            self.heads[path] = (mtime, text)
+            self.heads.move_to_end(path)
+            while len(self.heads) > self.capacity:
+                self.heads.popitem(last=False)
+        return text
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            # a client that never sends must not hold up the next preview
+            conn.settimeout(2)
+            threading.Thread(target=self._answer, args=(conn,), daemon=True).start()
+
+    def _answer(self, conn: socket.socket):
+        with conn:
+            try:
+                request = conn.makefile(encoding="utf-8", errors="replace").readline()
+                token, _, rest = request.rstrip("\n").partition("\t")
+                if not hmac.compare_digest(token.encode(), self.token.encode()):
+                    return
+                index, _, path = rest.partition("\t")
+                text = self.head(path) if path in self.allowed else ""
+                conn.sendall(text.encode("utf-8", errors="replace"))
+            except OSError:
+                return
+        if index.isdigit():
+            with self.cursor:
+                self.target = int(index)
+                self.cursor.notify()
+
+    def _warm_loop(self):
+        """Read ahead the entries around the last one shown, nearest first"""
+        while True:
+            with self.cursor:
+                while self.target is None:
+                    self.cursor.wait()
+                center, self.target = self.target, None
+                files = self.files
+            for step in range(self.radius + 1):
+                for i in (center + step, center - step):
+                    if 0 <= i < len(files):
+                        self.head(files[i])
+                if self.target is not None:
+                    # cursor moved on, start over around the new entry
+                    break
+
+    def close(self):
+        self.sock.close()
+
 class FZF:
+    preview_server: Optional[PreviewServer] = None
+
+    @staticmethod
+    def preview_args(prompts: List[Path]) -> tuple:
+        """(fzf preview arguments, environment), served in-process when bash exists"""
+        bash = shutil.which("bash")
+        if not bash:
+            return ["--preview", "head -20 {2}"], None
+        if FZF.preview_server is None:
+            try:
+                FZF.preview_server = PreviewServer()
+            except OSError:
+                return ["--preview", "head -20 {2}"], None
+        FZF.preview_server.set_files(prompts)
+        # fzf runs the preview with $SHELL -c, /dev/tcp needs bash
+        return (["--preview", FZF.preview_server.preview_command()],
+                {**os.environ, "SHELL": bash, "PROMPT_PREVIEW_TOKEN": FZF.preview_server.token})
+
     @staticmethod
     def select_file(prompts: List[Path]) -> Optional[Path]:
         """Use fzf to select a file from list"""
@@ -150,12 +282,14 @@ class FZF:
             rel_path = prompt.relative_to(prompt.parent.parent) if prompt.parent.parent else prompt.name
             file_list.append(f"{rel_path}\t{prompt}")
         
+        preview, env = FZF.preview_args(prompts)
         try:
             result = subprocess.run(
-                ["fzf", "--delimiter=\t", "--with-nth=1", "--preview", "head -20 {2}"],
+                ["fzf", "--delimiter=\t", "--with-nth=1"] + preview,
                 input="\n".join(file_list),
                 text=True,
                 capture_output=True,
+                env=env,
                 timeout=30
             )
             
@@ -240,6 +374,9 @@ class PromptComposer:
     
     def cleanup(self):
         """Cleanup temporary files"""
+        if FZF.preview_server:
+            FZF.preview_server.close()
+            FZF.preview_server = None
         if self.config.temp_dir.exists():
             shutil.rmtree(self.config.temp_dir)
     
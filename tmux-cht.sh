@@ -1,6 +1,8 @@
 #!/usr/bin/env bash
 # https://github.com/ThePrimeagen/.dotfiles/blob/master/bin/.local/bin/tmux-cht.sh
-selected=`cat ~/code/scripts/tmux-cht-languages | fzf`
+# lookups go through ./cht, which caches them (cht --prefetch fills the topic lists)
+scripts=$(dirname "$(realpath "$0")")
+selected=`cat $scripts/tmux-cht-languages | fzf`
 if [[ -z $selected ]]; then
     exit 0
 fi
@@ -8,4 +10,4 @@ fi
 read -p "Enter Query: " query
 
 query=`echo $query | tr ' ' '+'`
-tmux neww bash -c "echo \"curl cht.sh/$selected/$query/\" & curl cht.sh/$selected/$query & while [ : ]; do sleep 1; done" 
+tmux neww bash -c "echo \"cht $selected $query\" & $scripts/cht $selected $query & while [ : ]; do sleep 1; done"